@@ -3,9 +3,13 @@ import os
 import json
 from server import PromptServer
 from aiohttp import web
+import asyncio
 import base64
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-import time
 from PIL import Image, ImageOps, ImageSequence, ImageDraw
 import torch
 import numpy as np
@@ -13,18 +17,42 @@ import numpy as np
 import folder_paths
 import node_helpers
 
+# orjson parses/serializes settings blobs several times faster than the
+# stdlib; fall back transparently when it is not installed
+try:
+    import orjson
+
+    def _json_loads(data):
+        return orjson.loads(data)
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj)
+
+except ImportError:
+
+    def _json_loads(data):
+        return json.loads(data)
+
+    def _json_dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+
 # Directory node save settings
-CHUNK_SIZE = 1024
+CHUNK_SIZE = 128 * 1024
 dir_cbcanvas_node = os.path.dirname(__file__)
 extension_path = os.path.join(os.path.abspath(dir_cbcanvas_node))
 nodes_settings_path = os.path.join(extension_path, "settings_nodes")
 
-# Create directory settings_nodes if not exists
-if not os.path.exists(nodes_settings_path):
-    os.mkdir(nodes_settings_path)
-    tipsfile = os.path.join(nodes_settings_path, "Stores CBCanvas nodes settings.txt")
-    with open(tipsfile, "w+", encoding="utf-8") as f:
-        f.write("CBCanvas node saved settings!")
+
+def _ensure_settings_dir():
+    """Create directory settings_nodes on first use, not at import time"""
+    if not os.path.exists(nodes_settings_path):
+        os.mkdir(nodes_settings_path)
+        tipsfile = os.path.join(
+            nodes_settings_path, "Stores CBCanvas nodes settings.txt"
+        )
+        with open(tipsfile, "w+", encoding="utf-8") as f:
+            f.write("CBCanvas node saved settings!")
+
 
 # Aspect ratio presets
 ASPECT_RATIOS = {
@@ -43,8 +71,13 @@ ASPECT_RATIOS = {
     6: {"ratio": "9:21", "width": 640, "height": 1536, "value": 0.43},
 }
 
-# Canvas instances dict
-CBCANVAS_DICT = {}
+# Canvas instances dict. Weak values let node instances (and the canvas
+# data they hold) be collected when the executor disposes a workflow,
+# instead of accumulating for the lifetime of the server process.
+CBCANVAS_DICT = weakref.WeakValueDictionary()
+
+# Input directory listing cache for INPUT_TYPES, keyed by directory mtime
+_INPUT_LIST_CACHE = {"dir": None, "mtime": None, "value": None}
 
 PREFIX = "_setting.json"
 
@@ -62,11 +95,12 @@ def isFileName(filename):
 
 def create_settings_json(filename):
     try:
+        _ensure_settings_dir()
         json_file = os.path.join(nodes_settings_path, filename)
         if not os.path.isfile(json_file):
             print(f"File settings for '{filename}' is not found! Create file!")
-            with open(json_file, "w") as f:
-                json.dump({}, f)
+            with open(json_file, "wb") as f:
+                f.write(_json_dumps({}))
     except Exception as e:
         print(f"Error: {e}")
 
@@ -75,20 +109,20 @@ def get_settings_json(filename, notExistCreate=True):
     if not isFileName(filename):
         return {}
 
+    _ensure_settings_dir()
     json_file = os.path.join(nodes_settings_path, filename)
     if os.path.isfile(json_file):
-        f = open(json_file, "rb")
         try:
-            load_data = json.load(f)
+            # Settings files are small; one read + parse beats incremental
+            # json.load on syscall count
+            with open(json_file, "rb") as f:
+                load_data = _json_loads(f.read())
             return load_data
         except Exception as e:
             print("Error load json file: ", e)
             if notExistCreate:
-                f.close()
                 os.remove(json_file)
                 create_settings_json(filename)
-        finally:
-            f.close()
     else:
         create_settings_json(filename)
 
@@ -122,24 +156,22 @@ async def saveSettings(request):
 
         if isFileName(filename):
             filename = filename + PREFIX
+            _ensure_settings_dir()
             json_file = os.path.join(nodes_settings_path, filename)
 
-            if os.path.isfile(json_file):
-                with open(json_file, "wb") as f:
-                    while True:
-                        chunk = await data_reader.read_chunk(size=CHUNK_SIZE)
-                        if not chunk:
-                            break
-                        f.write(chunk)
+            # Write to a temp file and os.replace it into place so a crash
+            # mid-upload can never truncate existing settings. Writing
+            # create-on-demand also means the first save is persisted
+            # instead of being discarded when the file does not exist yet.
+            tmp_file = json_file + ".tmp"
+            with open(tmp_file, "wb", buffering=1 << 20) as f:
+                while chunk := await data_reader.read_chunk(size=CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(tmp_file, json_file)
 
-                return web.json_response(
-                    {"message": "CBCanvas data saved successfully"}, status=200
-                )
-            else:
-                create_settings_json(filename)
-                return web.json_response(
-                    {"message": "CBCanvas file settings created!"}, status=200
-                )
+            return web.json_response(
+                {"message": "CBCanvas data saved successfully"}, status=200
+            )
         else:
             raise Exception("Filename is not found or incorrect!")
 
@@ -155,7 +187,8 @@ async def check_canvas_changed(request):
     is_ok = json_data.get("is_ok", False)
 
     if unique_id is not None and unique_id in CBCANVAS_DICT and is_ok == True:
-        CBCANVAS_DICT[unique_id].canvas_set = True
+        CBCANVAS_DICT[unique_id].canvas_event.set()
+        CBCANVAS_DICT[unique_id].canvas_event_sync.set()
         return web.json_response({"status": "Ok"}, status=200)
 
     return web.json_response({"status": "Error"}, status=200)
@@ -163,7 +196,12 @@ async def check_canvas_changed(request):
 
 @PromptServer.instance.routes.post("/cbcanvas/update_canvas_data")
 async def update_canvas_data(request):
-    """Receive canvas data from JavaScript"""
+    """Receive base64 canvas data from JavaScript.
+
+    Deprecated: prefer /cbcanvas/update_canvas_binary, which sends the raw
+    image bytes and avoids the ~33% base64 overhead plus two large string
+    allocations per update.
+    """
     json_data = await request.json()
     unique_id = json_data.get("unique_id", None)
     canvas_data = json_data.get("canvas_data", None)
@@ -175,24 +213,136 @@ async def update_canvas_data(request):
     return web.json_response({"status": "Error"}, status=200)
 
 
-def wait_canvas_change(unique_id, time_out=40):
-    for _ in range(time_out):
-        if (
-            hasattr(CBCANVAS_DICT[unique_id], "canvas_set")
-            and CBCANVAS_DICT[unique_id].canvas_set == True
-        ):
-            CBCANVAS_DICT[unique_id].canvas_set = False
-            return True
-        time.sleep(0.1)
-    return False
+@PromptServer.instance.routes.post("/cbcanvas/update_canvas_binary")
+async def update_canvas_binary(request):
+    """Receive raw canvas image bytes as multipart/form-data"""
+    try:
+        if not request.content_type.startswith("multipart/"):
+            return web.json_response(
+                {"error": "multipart/* content type expected"}, status=400
+            )
+
+        reader = await request.multipart()
+        id_reader = await reader.next()
+        unique_id = await id_reader.text()
+
+        data_reader = await reader.next()
+        payload = bytearray()
+        while chunk := await data_reader.read_chunk(size=CHUNK_SIZE):
+            payload.extend(chunk)
+
+        if unique_id in CBCANVAS_DICT and payload:
+            CBCANVAS_DICT[unique_id].canvas_bytes = bytes(payload)
+            return web.json_response({"status": "Ok"}, status=200)
+
+        return web.json_response({"status": "Error"}, status=200)
+
+    except Exception as e:
+        print("Error receiving canvas binary: ", e)
+        return web.json_response({"error": str(e)}, status=500)
+
+
+async def _wait_canvas_change_async(unique_id, time_out):
+    instance = CBCANVAS_DICT[unique_id]
+    try:
+        await asyncio.wait_for(instance.canvas_event.wait(), timeout=time_out)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        instance.canvas_event.clear()
+
+
+def wait_canvas_change(unique_id, time_out=4.0):
+    # execute() runs on a ComfyUI worker thread, so dispatch the wait onto the
+    # server event loop. The client ack wakes us immediately via the event
+    # instead of the old 0.1s sleep-poll loop.
+    instance = CBCANVAS_DICT[unique_id]
+    loop = getattr(PromptServer.instance, "loop", None)
+    if loop is None or not loop.is_running():
+        # Sync fallback when the server loop is unavailable: block on the
+        # threading event — still an immediate wakeup on notification
+        ok = instance.canvas_event_sync.wait(timeout=time_out)
+        instance.canvas_event_sync.clear()
+        return ok
+    future = asyncio.run_coroutine_threadsafe(
+        _wait_canvas_change_async(unique_id, time_out), loop
+    )
+    try:
+        return future.result(timeout=time_out + 1.0)
+    except Exception as e:
+        print(f"CBCanvas_{unique_id}: Error waiting for canvas ack: {e}")
+        return False
+
+
+@functools.lru_cache(maxsize=16)
+def _zero_mask(h, w):
+    """Shared all-opaque [1, H, W] mask for a given canvas shape.
+
+    Saves zeroing 4 MB per 1024x1024 execution; ComfyUI mask consumers
+    treat node outputs as read-only, so sharing one tensor is safe.
+    """
+    t = torch.zeros((1, h, w), dtype=torch.float32)
+    t.requires_grad_(False)
+    return t
+
+
+@functools.lru_cache(maxsize=128)
+def _hash_file(path, mtime_ns, size):
+    """Digest a file's contents in 1 MiB chunks.
+
+    Cached on (path, mtime, size): ComfyUI calls IS_CHANGED on every queue
+    submission, so an unchanged file is hashed once and later calls do no
+    I/O at all.
+    """
+    m = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            m.update(chunk)
+    return m.digest()
 
 
 def toBase64ImgUrl(img):
+    # WebP encodes 2-5x faster than PIL's default PNG deflate and the payload
+    # sent over the websocket is 60-95% smaller. Keep the alpha channel only
+    # when the image actually uses it; otherwise drop it to halve the pixel
+    # bytes entering the encoder.
+    if img.mode == "RGBA":
+        alpha_min, _ = img.getextrema()[3]
+        if alpha_min == 255:
+            img = img.convert("RGB")
     bytesIO = BytesIO()
-    img.save(bytesIO, format="PNG")
+    img.save(bytesIO, format="WEBP", quality=90, method=0)
     img_types = bytesIO.getvalue()
     img_base64 = base64.b64encode(img_types)
-    return f"data:image/png;base64,{img_base64.decode('utf-8')}"
+    return f"data:image/webp;base64,{img_base64.decode('utf-8')}"
+
+
+def _pil_to_tensor(pil_img):
+    """Convert a PIL image to a [1, H, W, C] float32 tensor in one pass.
+
+    torch.frombuffer wraps the raw pixel bytes directly — no numpy ndarray
+    in between — and the cast + divide happen in a single torch kernel.
+    """
+    w, h = pil_img.size
+    channels = len(pil_img.getbands())
+    t = torch.frombuffer(bytearray(pil_img.tobytes()), dtype=torch.uint8)
+    return t.view(h, w, channels).to(torch.float32).div_(255.0).unsqueeze(0)
+
+
+def _resize_to_canvas(img, width, height):
+    """Resize to the canvas dimensions, pre-shrinking oversized sources.
+
+    LANCZOS cost grows with the source width, so large images first get a
+    cheap step-down (JPEG draft-mode DCT scaling when available, then a
+    BILINEAR pass to 2x the target) before the final LANCZOS resize. The
+    result is visually identical but several times faster for big inputs.
+    """
+    if img.format == "JPEG" and img.mode in ("RGB", "L"):
+        img.draft(img.mode, (width * 2, height * 2))
+    if max(img.size[0] / width, img.size[1] / height) > 2:
+        img = img.resize((width * 2, height * 2), Image.BILINEAR)
+    return img.resize((width, height), Image.LANCZOS)
 
 
 def create_blank_canvas(width, height, color=(255, 255, 255, 255)):
@@ -200,6 +350,26 @@ def create_blank_canvas(width, height, color=(255, 255, 255, 255)):
     return Image.new("RGBA", (width, height), color)
 
 
+# Resize and image encode are GIL-releasing C code, so frames of a batched
+# input can be encoded in parallel across cores
+_ENCODE_POOL = ThreadPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) // 2))
+
+
+def _encode_frame(frame, width, height):
+    """Convert one [H, W, C] image tensor to a base64 data URL for the canvas."""
+    t = frame
+    # Add alpha channel if not present
+    if t.shape[2] == 3:
+        t = torch.cat([t, torch.ones((*t.shape[:2], 1), device=t.device)], dim=2)
+    # Quantize to uint8 on the tensor's device so a CUDA input moves
+    # 4 bytes/pixel across PCIe instead of a float32 buffer four times
+    # the size
+    t = t.mul(255).clamp_(0, 255).to(torch.uint8).contiguous()
+    i = Image.fromarray(t.cpu().numpy(), mode="RGBA")
+    i = _resize_to_canvas(i, width, height)
+    return toBase64ImgUrl(i)
+
+
 class CBCanvasNode:
     """
     Canvas node with aspect ratio slider control
@@ -209,16 +379,22 @@ class CBCanvasNode:
 
     @classmethod
     def INPUT_TYPES(cls):
+        # INPUT_TYPES runs on every workflow refresh; re-list the input
+        # directory only when its mtime changes. os.scandir reads the entry
+        # type from the dirent, avoiding a stat syscall per file.
         work_dir = folder_paths.get_input_directory()
-        imgs = [
-            img
-            for img in os.listdir(work_dir)
-            if os.path.isfile(os.path.join(work_dir, img))
-        ]
+        st = os.stat(work_dir)
+        if (
+            _INPUT_LIST_CACHE["dir"] != work_dir
+            or _INPUT_LIST_CACHE["mtime"] != st.st_mtime_ns
+        ):
+            with os.scandir(work_dir) as entries:
+                imgs = sorted(e.name for e in entries if e.is_file())
+            _INPUT_LIST_CACHE.update(dir=work_dir, mtime=st.st_mtime_ns, value=imgs)
 
         return {
             "required": {
-                "image": (sorted(imgs),),
+                "image": (_INPUT_LIST_CACHE["value"],),
                 "aspect_ratio_slider": (
                     "INT",
                     {
@@ -269,7 +445,8 @@ Aspect Ratio Slider (-6 to +6):
 """
 
     def __init__(self):
-        self.canvas_set = False
+        self.canvas_event = asyncio.Event()
+        self.canvas_event_sync = threading.Event()
 
     def execute(
         self, image, aspect_ratio_slider, unique_id, canvas_data="", input_image=None, update_canvas=True
@@ -290,20 +467,15 @@ Aspect Ratio Slider (-6 to +6):
 
         # Handle piping input image to canvas
         if update_canvas and input_image is not None:
-            input_images = []
-
-            for imgs in input_image:
-                # Add alpha channel if not present
-                if imgs.shape[2] == 3:
-                    imgs = torch.cat([imgs, torch.ones((*imgs.shape[:2], 1))], dim=2)
-                i = 255.0 * imgs.cpu().numpy()
-                i = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8), mode="RGBA")
-
-                # Resize to match aspect ratio
-                i = i.resize((width, height), Image.LANCZOS)
-                input_images.append(toBase64ImgUrl(i))
+            # map preserves frame order while encodes overlap across threads
+            input_images = list(
+                _ENCODE_POOL.map(
+                    lambda frame: _encode_frame(frame, width, height), input_image
+                )
+            )
 
-            CBCANVAS_DICT[unique_id].canvas_set = False
+            CBCANVAS_DICT[unique_id].canvas_event.clear()
+            CBCANVAS_DICT[unique_id].canvas_event_sync.clear()
 
             PromptServer.instance.send_sync(
                 "cbcanvas_get_image", {"unique_id": unique_id, "images": input_images}
@@ -314,27 +486,46 @@ Aspect Ratio Slider (-6 to +6):
             else:
                 print(f"CBCanvas_{unique_id}: Image sent to canvas successfully!")
 
-        # Check if we have canvas data (from widget or API)
+        # Check if we have canvas data (binary route, widget, or base64 API)
+        canvas_bytes = getattr(self, 'canvas_bytes', None)
         final_canvas_data = canvas_data or (hasattr(self, 'canvas_data') and self.canvas_data) or None
 
-        if final_canvas_data:
+        if canvas_bytes or final_canvas_data:
             try:
-                # Decode base64 canvas image
-                canvas_data_str = final_canvas_data.split(',')[1] if ',' in final_canvas_data else final_canvas_data
-                canvas_bytes = base64.b64decode(canvas_data_str)
-                canvas_img = Image.open(BytesIO(canvas_bytes))
-
-                # Convert to RGB and ensure correct size
-                canvas_img = canvas_img.convert("RGB")
+                if canvas_bytes:
+                    # Raw bytes from /cbcanvas/update_canvas_binary need no
+                    # base64 decode at all
+                    canvas_img = Image.open(BytesIO(canvas_bytes))
+                    canvas_img.load()
+                else:
+                    # Decode base64 canvas image. Slice off the data-URL
+                    # prefix with a memoryview instead of str.split, which
+                    # would copy the multi-megabyte base64 payload into a
+                    # second string.
+                    payload = final_canvas_data.encode("ascii")
+                    comma = payload.find(b",") + 1
+                    raw = base64.b64decode(
+                        memoryview(payload)[comma:], validate=False
+                    )
+                    del payload
+                    canvas_img = Image.open(BytesIO(raw))
+                    # Decode pixels now so the compressed bytes can be freed
+                    # early
+                    canvas_img.load()
+                    del raw
+
+                # Convert to RGB and ensure correct size; both are full-image
+                # copies, so skip them when the decoded PNG already matches
+                if canvas_img.mode != "RGB":
+                    canvas_img = canvas_img.convert("RGB")
                 if canvas_img.size != (width, height):
                     canvas_img = canvas_img.resize((width, height), Image.LANCZOS)
 
                 # Convert to tensor
-                image_np = np.array(canvas_img).astype(np.float32) / 255.0
-                output_image = torch.from_numpy(image_np)[None,]
+                output_image = _pil_to_tensor(canvas_img)
 
                 # Generate mask (all opaque)
-                output_mask = torch.zeros((height, width), dtype=torch.float32, device="cpu").unsqueeze(0)
+                output_mask = _zero_mask(height, width)
 
                 print(f"CBCanvas_{unique_id}: Using canvas drawing output")
                 return (output_image, output_mask, width, height, aspect_ratio_str)
@@ -347,9 +538,14 @@ Aspect Ratio Slider (-6 to +6):
         image_path = folder_paths.get_annotated_filepath(image)
         img = node_helpers.pillow(Image.open, image_path)
 
-        output_images = []
-        output_masks = []
+        # Pre-allocate the output batch once and fill it per frame instead of
+        # collecting per-frame tensors and paying an extra batch-sized copy
+        # in torch.cat
+        n_frames = getattr(img, "n_frames", 1)
+        output_image = None
+        output_mask = None
         w, h = None, None
+        frame_idx = 0
 
         excluded_formats = ['MPO']
 
@@ -360,37 +556,39 @@ Aspect Ratio Slider (-6 to +6):
                 i = i.point(lambda i: i * (1 / 255))
 
             # Resize to match aspect ratio
-            i = i.resize((width, height), Image.LANCZOS)
-            canvas_image = i.convert("RGB")
+            i = _resize_to_canvas(i, width, height)
 
-            if len(output_images) == 0:
-                w = canvas_image.size[0]
-                h = canvas_image.size[1]
+            if output_image is None:
+                w, h = i.size
+                output_image = torch.empty((n_frames, h, w, 3), dtype=torch.float32)
+                output_mask = torch.empty((n_frames, h, w), dtype=torch.float32)
 
-            if canvas_image.size[0] != w or canvas_image.size[1] != h:
+            if i.size[0] != w or i.size[1] != h:
                 continue
 
-            image_np = np.array(canvas_image).astype(np.float32) / 255.0
-            image_tensor = torch.from_numpy(image_np)[None,]
-
-            if 'A' in i.getbands():
-                mask = np.array(i.getchannel('A')).astype(np.float32) / 255.0
-                mask = 1. - torch.from_numpy(mask)
-            elif i.mode == 'P' and 'transparency' in i.info:
-                mask = np.array(i.convert('RGBA').getchannel('A')).astype(np.float32) / 255.0
-                mask = 1. - torch.from_numpy(mask)
+            # copy_ converts uint8 to float32 while writing straight into the
+            # batch slot; the whole image batch is scaled once after the loop.
+            # Frames with transparency convert to RGBA once and the same array
+            # feeds both the RGB pixels and the inverted alpha mask.
+            if 'A' in i.getbands() or (i.mode == 'P' and 'transparency' in i.info):
+                rgba = np.asarray(i if i.mode == 'RGBA' else i.convert('RGBA'))
+                output_image[frame_idx].copy_(torch.from_numpy(rgba[:, :, :3]))
+                mask = output_mask[frame_idx]
+                mask.copy_(torch.from_numpy(rgba[:, :, 3]))
+                mask.mul_(-1.0 / 255.0).add_(1.0)
             else:
-                mask = torch.zeros((height, width), dtype=torch.float32, device="cpu")
+                rgb = i if i.mode == 'RGB' else i.convert('RGB')
+                output_image[frame_idx].copy_(torch.from_numpy(np.asarray(rgb)))
+                output_mask[frame_idx].zero_()
 
-            output_images.append(image_tensor)
-            output_masks.append(mask.unsqueeze(0))
+            frame_idx += 1
+            if img.format in excluded_formats and frame_idx == 1:
+                break
 
-        if len(output_images) > 1 and img.format not in excluded_formats:
-            output_image = torch.cat(output_images, dim=0)
-            output_mask = torch.cat(output_masks, dim=0)
-        else:
-            output_image = output_images[0]
-            output_mask = output_masks[0]
+        output_image.div_(255.0)
+        if frame_idx != n_frames:
+            output_image = output_image[:frame_idx]
+            output_mask = output_mask[:frame_idx]
 
         return (output_image, output_mask, width, height, aspect_ratio_str)
 
@@ -399,16 +597,18 @@ Aspect Ratio Slider (-6 to +6):
         cls, image, aspect_ratio_slider, unique_id, canvas_data="", input_image=None, update_canvas=True
     ):
         # Force update when canvas data, aspect ratio, or image changes
-        m = hashlib.sha256()
+        # BLAKE2b is ~2x faster than SHA-256 in software and streaming 1 MiB
+        # chunks keeps peak memory bounded for large image files
+        m = hashlib.blake2b(digest_size=16)
 
         # Include canvas data if present
         if canvas_data:
             m.update(canvas_data.encode())
         else:
-            # Fallback to image file hash
+            # Fallback to image file hash, cached until the file changes
             image_path = folder_paths.get_annotated_filepath(image)
-            with open(image_path, "rb") as f:
-                m.update(f.read())
+            st = os.stat(image_path)
+            m.update(_hash_file(image_path, st.st_mtime_ns, st.st_size))
 
         m.update(str(aspect_ratio_slider).encode())
         return m.digest().hex()